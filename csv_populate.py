@@ -218,6 +218,17 @@ TRUNCATE TABLE categories;
 TRUNCATE TABLE suppliers;
 TRUNCATE TABLE sales_representatives;
 
+-- Clear derived rollups so `python rollup.py backfill` rebuilds them from scratch
+TRUNCATE TABLE sales_daily_rollup;
+TRUNCATE TABLE sales_monthly_rollup;
+TRUNCATE TABLE sales_quarterly_rollup;
+TRUNCATE TABLE sales_rollup_queue;
+TRUNCATE TABLE rollup_state;
+
+-- Clear RFM segments; with no marker left in rollup_state, `python rfm.py` rebuilds its state
+TRUNCATE TABLE customer_rfm_segments;
+TRUNCATE TABLE rfm_customer_queue;
+
 -- Import Categories
 LOAD DATA INFILE 'C:/Users/bruno/Documents/sales-project/data/categories.csv'
 INTO TABLE categories
@@ -306,6 +317,8 @@ FROM sales WHERE payment_status = 'paid';
     print("   1. Run: python csv_populate.py")
     print("   2. Update file paths in import_data.sql")
     print("   3. Run: mysql -u username -p sales_db < import_data.sql")
+    print("   4. Run: python rollup.py backfill")
+    print("   5. Run: python rfm.py")
 
 if __name__ == "__main__":
     # Generate massive amounts of data quickly
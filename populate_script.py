@@ -1,9 +1,14 @@
+import argparse
 import mysql.connector
 import random
 from datetime import datetime, timedelta
 from faker import Faker
+import os
 import sys
 
+from rfm import STATE_PATH as RFM_STATE_PATH
+from rollup import refresh_sales_rollup
+
 # Initialize Faker for generating realistic data
 fake = Faker()
 
@@ -33,7 +38,9 @@ def clear_existing_data(cursor):
     cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
     
     tables = ['sale_items', 'sales', 'products', 'customers', 'categories', 
-              'suppliers', 'sales_representatives']
+              'suppliers', 'sales_representatives', 'sales_daily_rollup', 'sales_monthly_rollup', 
+              'sales_quarterly_rollup', 'sales_rollup_queue', 'rollup_state',
+              'customer_rfm_segments', 'rfm_customer_queue']
     
     for table in tables:
         cursor.execute(f"TRUNCATE TABLE {table}")
@@ -41,6 +48,11 @@ def clear_existing_data(cursor):
     
     # Re-enable foreign key checks
     cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    
+    # Saved RFM state describes the old data (rfm.py would also rebuild on its own)
+    if os.path.exists(RFM_STATE_PATH):
+        os.remove(RFM_STATE_PATH)
+        print(f"   Removed {RFM_STATE_PATH}")
     print("✅ Data cleared successfully!")
 
 def check_and_fix_duplicates(cursor):
@@ -180,8 +192,8 @@ def populate_sales_representatives(cursor, count=25):
     
     print(f"✅ Created {count} sales representatives")
 
-def populate_customers(cursor, count=1000):
-    """Populate customers table"""
+def populate_customers(cursor, count=1000, start_id=0, start_date='-2y', end_date='now'):
+    """Populate customers table (start_id continues numbering after existing customers)"""
     print(f"👤 Creating {count} customers...")
     
     used_emails = set()
@@ -194,6 +206,10 @@ def populate_customers(cursor, count=1000):
         for i in range(batch_start, batch_end):
             # Generate unique email
             email = fake.email()
+            if start_id:
+                # Appending: tag with the new customer number so it can't clash with existing rows
+                user, domain = email.split('@')
+                email = f"{user}.{start_id + i + 1}@{domain}"
             attempts = 0
             while email in used_emails and attempts < 10:
                 email = fake.email()
@@ -201,11 +217,11 @@ def populate_customers(cursor, count=1000):
             
             # If still duplicate after 10 attempts, create a unique one
             if email in used_emails:
-                email = f"customer{i+1}_{fake.random_int(1000, 9999)}@{fake.free_email_domain()}"
+                email = f"customer{start_id + i + 1}_{fake.random_int(1000, 9999)}@{fake.free_email_domain()}"
             
             used_emails.add(email)
             
-            reg_date = fake.date_time_between(start_date='-2y', end_date='now')
+            reg_date = fake.date_time_between(start_date=start_date, end_date=end_date)
             batch_data.append((
                 fake.first_name(),
                 fake.last_name(),
@@ -230,8 +246,8 @@ def populate_customers(cursor, count=1000):
     
     print(f"✅ Created {count} customers")
 
-def populate_products(cursor, count=500):
-    """Populate products table"""
+def populate_products(cursor, count=500, start_id=0):
+    """Populate products table (start_id continues SKU numbering after existing products)"""
     print(f"📦 Creating {count} products...")
     
     # Get category and supplier IDs
@@ -252,7 +268,7 @@ def populate_products(cursor, count=500):
             
             batch_data.append((
                 fake.catch_phrase()[:100],  # product name
-                f"SKU-{i+1:06d}",  # product code
+                f"SKU-{start_id + i + 1:06d}",  # product code
                 random.choice(category_ids) if category_ids else None,
                 random.choice(supplier_ids) if supplier_ids else None,
                 price,
@@ -274,16 +290,22 @@ def populate_products(cursor, count=500):
     
     print(f"✅ Created {count} products")
 
-def populate_sales_and_items(cursor, sales_count=2000):
-    """Populate sales and sale_items tables"""
+def populate_sales_and_items(cursor, sales_count=2000, start_date='-1y', end_date='now',
+                             customer_ids=None, products=None):
+    """Populate sales and sale_items tables
+
+    customer_ids and products ((product_id, price) rows) default to every active row.
+    """
     print(f"💰 Creating {sales_count} sales with items...")
     
     # Get active customers, products, and sales reps
-    cursor.execute("SELECT customer_id FROM customers WHERE is_active = TRUE")
-    customer_ids = [row[0] for row in cursor.fetchall()]
+    if customer_ids is None:
+        cursor.execute("SELECT customer_id FROM customers WHERE is_active = TRUE")
+        customer_ids = [row[0] for row in cursor.fetchall()]
     
-    cursor.execute("SELECT product_id, price FROM products WHERE is_active = TRUE")
-    products = cursor.fetchall()
+    if products is None:
+        cursor.execute("SELECT product_id, price FROM products WHERE is_active = TRUE")
+        products = cursor.fetchall()
     
     cursor.execute("SELECT rep_id FROM sales_representatives WHERE is_active = TRUE")
     rep_ids = [row[0] for row in cursor.fetchall()]
@@ -297,7 +319,7 @@ def populate_sales_and_items(cursor, sales_count=2000):
     
     for i in range(sales_count):
         # Create sale
-        sale_date = fake.date_time_between(start_date='-1y', end_date='now')
+        sale_date = fake.date_time_between(start_date=start_date, end_date=end_date)
         tax_rate = 0.08  # 8% tax
         
         cursor.execute("""
@@ -394,6 +416,10 @@ def generate_sample_data(clear_data=True,
         check_and_fix_duplicates(cursor)
         conn.commit()
         
+        # Bring the daily sales rollup up to date with the new sales
+        refresh_sales_rollup(cursor)
+        conn.commit()
+        
         print("\n🎉 Database population completed successfully!")
         print("\n📈 Summary:")
         
@@ -428,14 +454,144 @@ def generate_sample_data(clear_data=True,
         cursor.close()
         conn.close()
 
+def sample_active_rows(cursor, table, id_column, columns, max_id, k):
+    """Pick up to k random active rows with primary key lookups instead of scanning every ID"""
+    candidates = random.sample(range(1, max_id + 1), min(k, max_id))
+    rows = []
+    
+    batch_size = 1000
+    for batch_start in range(0, len(candidates), batch_size):
+        batch = candidates[batch_start:batch_start + batch_size]
+        placeholders = ', '.join(['%s'] * len(batch))
+        cursor.execute(f"""
+            SELECT {columns} FROM {table} 
+            WHERE {id_column} IN ({placeholders}) AND is_active = TRUE
+        """, batch)
+        rows.extend(cursor.fetchall())
+    
+    return rows
+
+def append_sample_data(days=30, sales_per_day=None):
+    """Add `days` more days of activity after the latest sale, without clearing existing data
+
+    IDs and SKUs continue from the current maximums. New customers and products are
+    added in proportion to the new sales. Only the new rows and a random sample of
+    existing active customers and products are read back; no table is scanned in full.
+    """
+    print(f"🚀 Appending {days} days of activity...")
+    
+    conn = connect_to_database()
+    cursor = conn.cursor()
+    
+    try:
+        # Index/primary key lookups only
+        cursor.execute("SELECT MAX(sale_date), MAX(sale_id) FROM sales")
+        last_sale_date, max_sale_id = cursor.fetchone()
+        
+        cursor.execute("SELECT MAX(customer_id) FROM customers")
+        max_customer_id = cursor.fetchone()[0] or 0
+        
+        cursor.execute("SELECT MAX(product_id) FROM products")
+        max_product_id = cursor.fetchone()[0] or 0
+        
+        if last_sale_date is None:
+            print("❌ No existing sales found! Run generate_sample_data first.")
+            return
+        
+        # Default to the daily sales rate of the last 30 days of data
+        if sales_per_day is None:
+            cursor.execute("""
+                SELECT COUNT(*) FROM sales 
+                WHERE sale_date > %s
+            """, (last_sale_date - timedelta(days=30),))
+            sales_per_day = max(1, cursor.fetchone()[0] / 30)
+        
+        new_sales = max(1, round(days * sales_per_day))
+        growth = new_sales / max_sale_id
+        new_customers = round(max_customer_id * growth)
+        new_products = round(max_product_id * growth)
+        start_date = last_sale_date + timedelta(seconds=1)
+        end_date = last_sale_date + timedelta(days=days)
+        
+        print(f"📊 Will create: {new_customers} customers, {new_products} products, {new_sales} sales "
+              f"({start_date:%Y-%m-%d} → {end_date:%Y-%m-%d})")
+        
+        # New customers register before the appended window so none of their sales
+        # can be dated before their registration
+        populate_customers(cursor, new_customers, start_id=max_customer_id,
+                           start_date=last_sale_date - timedelta(days=days),
+                           end_date=last_sale_date)
+        conn.commit()
+        
+        populate_products(cursor, new_products, start_id=max_product_id)
+        conn.commit()
+        
+        # New rows are a primary key range; existing ones are sampled
+        cursor.execute("""
+            SELECT customer_id FROM customers 
+            WHERE customer_id > %s AND is_active = TRUE
+        """, (max_customer_id,))
+        customer_ids = [row[0] for row in cursor.fetchall()]
+        customer_ids += [row[0] for row in sample_active_rows(
+            cursor, 'customers', 'customer_id', 'customer_id', max_customer_id, new_sales)]
+        
+        cursor.execute("""
+            SELECT product_id, price FROM products 
+            WHERE product_id > %s AND is_active = TRUE
+        """, (max_product_id,))
+        products = cursor.fetchall()
+        products += sample_active_rows(
+            cursor, 'products', 'product_id', 'product_id, price', max_product_id, new_sales * 5)
+        
+        populate_sales_and_items(cursor, new_sales, start_date=start_date, end_date=end_date,
+                                 customer_ids=customer_ids, products=products)
+        conn.commit()
+        
+        # Only the appended days need re-aggregating
+        refresh_sales_rollup(cursor)
+        conn.commit()
+        
+        print("\n🎉 Append completed successfully!")
+        print(f"   👤 Customers: +{new_customers}")
+        print(f"   📦 Products: +{new_products}")
+        print(f"   💰 Sales: +{new_sales} (through {end_date:%Y-%m-%d})")
+        
+    except mysql.connector.IntegrityError as e:
+        print(f"❌ Database integrity error: {e}")
+        conn.rollback()
+    except Exception as e:
+        print(f"❌ Error during append: {e}")
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
 if __name__ == "__main__":
-    # Customize these numbers based on your needs
-    generate_sample_data(
-        clear_data=True,    # Set to False if you want to add to existing data
-        categories=20,      # Number of product categories
-        suppliers=50,       # Number of suppliers
-        sales_reps=25,      # Number of sales representatives
-        customers=1000,     # Number of customers
-        products=500,       # Number of products
-        sales=2000          # Number of sales transactions
-    )
+    parser = argparse.ArgumentParser(description="Populate the sales database with sample data")
+    parser.add_argument('--append-days', type=int,
+                        help="Append this many days of activity after the latest sale instead of regenerating everything")
+    parser.add_argument('--sales-per-day', type=float,
+                        help="Sales per appended day (defaults to the rate of the last 30 days)")
+    args = parser.parse_args()
+
+    if args.append_days is not None and args.append_days < 1:
+        parser.error("--append-days must be at least 1")
+    if args.sales_per_day is not None:
+        if args.sales_per_day <= 0:
+            parser.error("--sales-per-day must be greater than 0")
+        if args.append_days is None:
+            parser.error("--sales-per-day requires --append-days")
+
+    if args.append_days is not None:
+        append_sample_data(days=args.append_days, sales_per_day=args.sales_per_day)
+    else:
+        # Customize these numbers based on your needs
+        generate_sample_data(
+            clear_data=True,    # Set to False if you want to add to existing data
+            categories=20,      # Number of product categories
+            suppliers=50,       # Number of suppliers
+            sales_reps=25,      # Number of sales representatives
+            customers=1000,     # Number of customers
+            products=500,       # Number of products
+            sales=2000          # Number of sales transactions
+        )
@@ -0,0 +1,175 @@
+import csv
+
+# Customer IDs per IN (...) list, and sales returned per round trip
+ID_BATCH_SIZE = 1000
+PAGE_SIZE = 5000
+
+# Keyset predicate on (customer_id, sale_date, sale_id), written out so MySQL
+# can use a range scan on idx_sale_customer. sales.sale_date is NOT NULL, so the
+# comparisons never evaluate to NULL and silently drop the rest of a customer's sales.
+KEYSET_CONDITION = """
+    AND (s.customer_id > %s
+      OR (s.customer_id = %s
+          AND (s.sale_date > %s
+            OR (s.sale_date = %s AND s.sale_id > %s))))
+"""
+
+def _fetch_sales_page(cursor, customer_ids, after, page_size, itemized):
+    """Fetch one page of sales for a batch of customers, starting after the given keyset"""
+    placeholders = ', '.join(['%s'] * len(customer_ids))
+    params = list(customer_ids)
+    keyset = ''
+    if after is not None:
+        customer_id, sale_date, sale_id = after
+        keyset = KEYSET_CONDITION
+        params += [customer_id, customer_id, sale_date, sale_date, sale_id]
+    params.append(page_size)
+
+    page_query = f"""
+        SELECT s.customer_id, s.sale_id, s.sale_date, s.total_amount, s.payment_status
+        FROM sales s
+        WHERE s.customer_id IN ({placeholders})
+        {keyset}
+        ORDER BY s.customer_id, s.sale_date, s.sale_id
+        LIMIT %s
+    """
+
+    if itemized:
+        cursor.execute(page_query, params)
+        return [
+            {
+                'customer_id': customer_id,
+                'sale_id': sale_id,
+                'sale_date': sale_date,
+                'total_amount': total_amount,
+                'payment_status': payment_status,
+            }
+            for customer_id, sale_id, sale_date, total_amount, payment_status in cursor.fetchall()
+        ]
+
+    # Same output as GetCustomerPurchaseHistory, but only aggregating this page's sales
+    cursor.execute(f"""
+        SELECT
+          page.customer_id,
+          page.sale_id,
+          page.sale_date,
+          page.total_amount,
+          page.payment_status,
+          GROUP_CONCAT(
+            CONCAT(p.product_name, ' (', si.quantity, ')')
+            SEPARATOR ', '
+          ) AS products_purchased
+        FROM ({page_query}) AS page
+        LEFT JOIN sale_items si ON page.sale_id = si.sale_id
+        LEFT JOIN products p ON si.product_id = p.product_id
+        GROUP BY page.customer_id, page.sale_id, page.sale_date,
+                 page.total_amount, page.payment_status
+        ORDER BY page.customer_id, page.sale_date, page.sale_id
+    """, params)
+    return [
+        {
+            'customer_id': customer_id,
+            'sale_id': sale_id,
+            'sale_date': sale_date,
+            'total_amount': total_amount,
+            'payment_status': payment_status,
+            'products_purchased': products_purchased,
+        }
+        for customer_id, sale_id, sale_date, total_amount, payment_status, products_purchased
+        in cursor.fetchall()
+    ]
+
+def _attach_items(cursor, sales):
+    """Attach a structured item list to each sale in a page with a single query"""
+    by_sale = {sale['sale_id']: sale for sale in sales}
+    for sale in sales:
+        sale['items'] = []
+
+    placeholders = ', '.join(['%s'] * len(by_sale))
+    cursor.execute(f"""
+        SELECT si.sale_id, si.product_id, p.product_name, si.quantity,
+               si.unit_price, si.discount_percent, si.line_total
+        FROM sale_items si
+        JOIN products p ON si.product_id = p.product_id
+        WHERE si.sale_id IN ({placeholders})
+        ORDER BY si.sale_id, si.sale_item_id
+    """, list(by_sale))
+
+    for sale_id, product_id, product_name, quantity, unit_price, discount_percent, line_total in cursor.fetchall():
+        by_sale[sale_id]['items'].append({
+            'product_id': product_id,
+            'product_name': product_name,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'discount_percent': discount_percent,
+            'line_total': line_total,
+        })
+
+def iter_purchase_history(cursor, customer_ids, itemized=False,
+                          page_size=PAGE_SIZE, id_batch_size=ID_BATCH_SIZE):
+    """Stream purchase history for many customers, ordered by (customer_id, sale_date, sale_id)
+
+    Customers are processed in sorted batches of id_batch_size and each batch is paged
+    with a keyset on (customer_id, sale_date, sale_id), so every round trip returns up to
+    page_size sales. With itemized=True each sale carries an 'items' list instead of the
+    concatenated 'products_purchased' string.
+    """
+    ids = sorted(set(customer_ids))
+
+    for batch_start in range(0, len(ids), id_batch_size):
+        batch = ids[batch_start:batch_start + id_batch_size]
+        after = None
+
+        while True:
+            page = _fetch_sales_page(cursor, batch, after, page_size, itemized)
+            if not page:
+                break
+
+            if itemized:
+                _attach_items(cursor, page)
+
+            yield from page
+
+            if len(page) < page_size:
+                break
+            last = page[-1]
+            after = (last['customer_id'], last['sale_date'], last['sale_id'])
+
+def export_purchase_history(customer_ids, path='purchase_history.csv'):
+    """Export the purchase history of a customer segment to a CSV file"""
+    from populate_script import connect_to_database
+
+    print(f"📤 Exporting purchase history for {len(set(customer_ids)):,} customers...")
+
+    conn = connect_to_database()
+    cursor = conn.cursor()
+
+    try:
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['customer_id', 'sale_id', 'sale_date', 'total_amount',
+                             'payment_status', 'products_purchased'])
+            for row in iter_purchase_history(cursor, customer_ids):
+                writer.writerow([row['customer_id'], row['sale_id'], row['sale_date'],
+                                 row['total_amount'], row['payment_status'],
+                                 row['products_purchased']])
+                count += 1
+
+        print(f"✅ Exported {count:,} sales to {path}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    from populate_script import connect_to_database
+
+    # Example: export history for the "At Risk" RFM segment (see rfm.py)
+    conn = connect_to_database()
+    cursor = conn.cursor()
+    cursor.execute("SELECT customer_id FROM customer_rfm_segments WHERE segment = 'At Risk'")
+    segment_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+
+    export_purchase_history(segment_ids, 'purchase_history.csv')
@@ -0,0 +1,338 @@
+import math
+import os
+import pickle
+from bisect import bisect_left
+
+# Where the engine keeps per-customer state and sketches between runs
+STATE_PATH = 'rfm_state.pkl'
+
+# rollup_state row recording the last run whose segments were committed
+STATE_NAME = 'customer_rfm_segments'
+
+# Inner quintile edges, matching pd.qcut(..., 5)
+QUINTILES = (0.2, 0.4, 0.6, 0.8)
+
+def get_customer_segment(row):
+    """Map RFM scores to a named customer segment"""
+    if row['recency_score'] >= 4 and row['frequency_score'] >= 4 and row['monetary_score'] >= 4:
+        return 'Champions'
+    elif row['recency_score'] >= 3 and row['frequency_score'] >= 3 and row['monetary_score'] >= 3:
+        return 'Loyal Customers'
+    elif row['recency_score'] >= 4 and row['frequency_score'] <= 2:
+        return 'New Customers'
+    elif row['recency_score'] <= 2 and row['frequency_score'] >= 3:
+        return 'At Risk'
+    elif row['recency_score'] <= 2 and row['frequency_score'] <= 2:
+        return 'Lost Customers'
+    else:
+        return 'Potential Loyalists'
+
+class QuantileSketch:
+    """Mergeable quantile sketch over bucketed values
+
+    With relative_accuracy > 0 values fall into log-spaced buckets, so every quantile
+    is within that relative error (the DDSketch bucketing). With relative_accuracy = 0
+    each integer value gets its own bucket and quantiles are exact. Buckets are plain
+    counts, so values can be removed again when a customer's metrics change.
+    """
+
+    ZERO_KEY = -(2 ** 31)
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy) if relative_accuracy else None
+        self.counts = {}
+        self.total = 0
+
+    def key(self, value):
+        """Bucket key for a value; keys sort in the same order as values"""
+        if self.gamma is None:
+            return int(value)
+        if value <= 0:
+            return self.ZERO_KEY
+        return math.ceil(math.log(value, self.gamma))
+
+    def value(self, key):
+        """Representative value of a bucket"""
+        if self.gamma is None:
+            return key
+        if key == self.ZERO_KEY:
+            return 0.0
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        k = self.key(value)
+        self.counts[k] = self.counts.get(k, 0) + count
+        self.total += count
+
+    def remove(self, value, count=1):
+        k = self.key(value)
+        remaining = self.counts.get(k, 0) - count
+        if remaining < 0:
+            raise ValueError(f"Cannot remove {value}: not in sketch")
+        if remaining:
+            self.counts[k] = remaining
+        else:
+            del self.counts[k]
+        self.total -= count
+
+    def merge(self, other):
+        """Add another sketch's counts into this one (e.g. sketches built per customer range)"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for k, count in other.counts.items():
+            self.counts[k] = self.counts.get(k, 0) + count
+        self.total += other.total
+
+    def quantile_key(self, q):
+        """Bucket key of the q-th quantile, or None if the sketch is empty"""
+        if not self.total:
+            return None
+        target = q * self.total
+        cumulative = 0
+        for k in sorted(self.counts):
+            cumulative += self.counts[k]
+            if cumulative >= target:
+                return k
+        return k
+
+    def quantile(self, q):
+        k = self.quantile_key(q)
+        return None if k is None else self.value(k)
+
+class RFMEngine:
+    """Incremental RFM scoring
+
+    Keeps each customer's last purchase day, purchase count and total spend, plus one
+    quantile sketch per dimension for the quintile boundaries. Customers are updated
+    from metrics recomputed from the database, so new, changed and deleted sales are
+    all reflected; when a boundary moves, only customers whose bucket lies between
+    the old and new boundary are re-scored.
+
+    Recency is tracked as the last purchase day rather than days since it, so the
+    boundaries do not shift just because time passes. Frequency ties share a score
+    (the notebook breaks them with rank(method='first')).
+    """
+
+    DIMENSIONS = ('recency', 'frequency', 'monetary')
+
+    def __init__(self, monetary_accuracy=0.01):
+        self.customers = {}  # customer_id -> [last_purchase_day, frequency, monetary]
+        self.sketches = {
+            'recency': QuantileSketch(0),
+            'frequency': QuantileSketch(0),
+            'monetary': QuantileSketch(monetary_accuracy),
+        }
+        self.members = {dim: {} for dim in self.DIMENSIONS}  # dim -> bucket key -> customer ids
+        self.boundaries = {dim: [None] * len(QUINTILES) for dim in self.DIMENSIONS}
+        self.scores = {}  # customer_id -> (recency_score, frequency_score, monetary_score)
+        self.synced_at = None  # last_refreshed_at of the run this state was saved after
+
+    def _values(self, state):
+        last_day, frequency, monetary = state
+        return {'recency': last_day, 'frequency': frequency, 'monetary': monetary}
+
+    def _index(self, customer_id, state, add):
+        """Add or remove a customer's values from the sketches and bucket membership"""
+        for dim, value in self._values(state).items():
+            sketch = self.sketches[dim]
+            k = sketch.key(value)
+            bucket = self.members[dim].setdefault(k, set())
+            if add:
+                sketch.add(value)
+                bucket.add(customer_id)
+            else:
+                sketch.remove(value)
+                bucket.discard(customer_id)
+                if not bucket:
+                    del self.members[dim][k]
+
+    def update_customers(self, rows, customer_ids):
+        """Replace the metrics of customer_ids with recomputed rows
+
+        rows are (customer_id, last_sale_date, purchases, total_spent); a customer in
+        customer_ids without a row has no sales left and is dropped. Returns the sets
+        of (touched, removed) customers.
+        """
+        fresh = {
+            customer_id: [last_sale_date.toordinal(), int(purchases), float(total_spent or 0)]
+            for customer_id, last_sale_date, purchases, total_spent in rows
+        }
+
+        touched, removed = set(), set()
+        for customer_id in customer_ids:
+            old = self.customers.get(customer_id)
+            new = fresh.get(customer_id)
+            if old == new:
+                continue
+            if old is not None:
+                self._index(customer_id, old, add=False)
+            if new is None:
+                del self.customers[customer_id]
+                self.scores.pop(customer_id, None)
+                removed.add(customer_id)
+            else:
+                self.customers[customer_id] = new
+                self._index(customer_id, new, add=True)
+                touched.add(customer_id)
+        return touched, removed
+
+    def _score(self, customer_id):
+        values = self._values(self.customers[customer_id])
+        return tuple(
+            1 + bisect_left(self.boundaries[dim], self.sketches[dim].key(values[dim]))
+            for dim in self.DIMENSIONS
+        )
+
+    def rescore(self, touched):
+        """Re-score touched customers and any customer a boundary moved past
+
+        Returns {customer_id: (recency_score, frequency_score, monetary_score, segment)}
+        for customers whose scores changed.
+        """
+        candidates = set(touched)
+        for dim in self.DIMENSIONS:
+            sketch = self.sketches[dim]
+            new = [sketch.quantile_key(q) for q in QUINTILES]
+            for old_key, new_key in zip(self.boundaries[dim], new):
+                if old_key == new_key:
+                    continue
+                if old_key is None:
+                    candidates.update(self.customers)
+                    break
+                low, high = sorted((old_key, new_key))
+                for k, ids in self.members[dim].items():
+                    if low < k <= high:
+                        candidates.update(ids)
+            self.boundaries[dim] = new
+
+        moved = {}
+        for customer_id in candidates:
+            scores = self._score(customer_id)
+            if self.scores.get(customer_id) != scores:
+                self.scores[customer_id] = scores
+                recency_score, frequency_score, monetary_score = scores
+                segment = get_customer_segment({
+                    'recency_score': recency_score,
+                    'frequency_score': frequency_score,
+                    'monetary_score': monetary_score,
+                })
+                moved[customer_id] = scores + (segment,)
+        return moved
+
+    def save(self, path=STATE_PATH):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        """Load saved state, or start from scratch if there is none"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+def _customer_metrics(cursor, customer_ids=None, batch_size=1000):
+    """Recompute (customer_id, last_sale_date, purchases, total_spent) from sales
+
+    With customer_ids=None every customer is aggregated; otherwise only those customers,
+    through idx_sale_customer.
+    """
+    query = """
+        SELECT customer_id, MAX(sale_date), COUNT(*), SUM(total_amount)
+        FROM sales
+        {where}
+        GROUP BY customer_id
+    """
+    if customer_ids is None:
+        cursor.execute(query.format(where=''))
+        return cursor.fetchall()
+
+    rows = []
+    for batch_start in range(0, len(customer_ids), batch_size):
+        batch = customer_ids[batch_start:batch_start + batch_size]
+        placeholders = ', '.join(['%s'] * len(batch))
+        cursor.execute(query.format(where=f"WHERE customer_id IN ({placeholders})"), batch)
+        rows.extend(cursor.fetchall())
+    return rows
+
+def refresh_rfm_segments(cursor, rfm, batch_size=1000):
+    """Re-score customers queued since the last run and store segments that moved
+
+    Returns (engine, moved). The engine is a fresh one if the saved state did not match
+    the database, e.g. after the tables were cleared and reloaded.
+    """
+    # The saved state is only valid for the run the database last recorded
+    cursor.execute("SELECT last_refreshed_at FROM rollup_state WHERE rollup_name = %s", (STATE_NAME,))
+    row = cursor.fetchone()
+    rebuild = row is None or row[0] is None or row[0] != rfm.synced_at
+    if rebuild:
+        print("⚠️  Saved RFM state does not match the database, rebuilding from scratch")
+        rfm = RFMEngine(rfm.sketches['monetary'].relative_accuracy)
+        cursor.execute("DELETE FROM customer_rfm_segments")
+
+    # Read the queue before the sales so every change it lists is covered below
+    cursor.execute("SELECT queue_id, customer_id FROM rfm_customer_queue ORDER BY queue_id")
+    queued = cursor.fetchall()
+
+    if rebuild:
+        rows = _customer_metrics(cursor)
+        customer_ids = [customer_id for customer_id, _, _, _ in rows]
+    else:
+        customer_ids = sorted({customer_id for _, customer_id in queued})
+        rows = _customer_metrics(cursor, customer_ids, batch_size)
+
+    print(f"🔄 Recomputing RFM metrics for {len(customer_ids):,} customers...")
+    touched, removed = rfm.update_customers(rows, customer_ids)
+    moved = rfm.rescore(touched)
+
+    if moved:
+        cursor.executemany("""
+            INSERT INTO customer_rfm_segments (customer_id, recency_score, frequency_score,
+                                               monetary_score, segment)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE recency_score = VALUES(recency_score),
+                                    frequency_score = VALUES(frequency_score),
+                                    monetary_score = VALUES(monetary_score),
+                                    segment = VALUES(segment)
+        """, [(customer_id,) + row for customer_id, row in moved.items()])
+
+    if removed:
+        cursor.executemany("DELETE FROM customer_rfm_segments WHERE customer_id = %s",
+                           [(customer_id,) for customer_id in removed])
+
+    # Delete exactly the queue rows that were read; rows from transactions still open
+    # were not visible and are picked up next run
+    queue_ids = [queue_id for queue_id, _ in queued]
+    for batch_start in range(0, len(queue_ids), batch_size):
+        batch = queue_ids[batch_start:batch_start + batch_size]
+        placeholders = ', '.join(['%s'] * len(batch))
+        cursor.execute(f"DELETE FROM rfm_customer_queue WHERE queue_id IN ({placeholders})", batch)
+
+    cursor.execute("SELECT NOW()")
+    rfm.synced_at = cursor.fetchone()[0]
+    cursor.execute("""
+        INSERT INTO rollup_state (rollup_name, last_refreshed_at)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE last_refreshed_at = VALUES(last_refreshed_at)
+    """, (STATE_NAME, rfm.synced_at))
+
+    print(f"✅ Processed {len(queued):,} queued changes, {len(touched):,} customers changed, "
+          f"{len(moved):,} segments updated, {len(removed):,} removed")
+    return rfm, moved
+
+if __name__ == "__main__":
+    from populate_script import connect_to_database
+
+    rfm = RFMEngine.load(STATE_PATH)
+    conn = connect_to_database()
+    cursor = conn.cursor()
+    try:
+        rfm, _ = refresh_rfm_segments(cursor, rfm)
+        conn.commit()
+        # Only persist the state once the segments it produced are committed; if this
+        # save fails, the next run sees a mismatched synced_at and rebuilds
+        rfm.save(STATE_PATH)
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,132 @@
+import argparse
+from datetime import date, timedelta
+
+ROLLUP_NAME = 'sales_daily_rollup'
+
+def _day_ranges(days):
+    """Collapse a sorted list of days into inclusive (start, end) ranges of consecutive days"""
+    ranges = []
+    for day in days:
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(r) for r in ranges]
+
+def _set_watermark(cursor, refreshed_at):
+    cursor.execute("""
+        INSERT INTO rollup_state (rollup_name, last_refreshed_at)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE last_refreshed_at = VALUES(last_refreshed_at)
+    """, (ROLLUP_NAME, refreshed_at))
+
+def _use_read_committed(cursor):
+    """Read committed rows without waiting on writers
+
+    Under REPEATABLE READ the INSERT ... SELECT in RefreshSalesDailyRollup takes shared
+    locks on the sales it reads, so a refresh would block behind a long populate or
+    append transaction. Applies from the next transaction on this connection.
+    """
+    cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED")
+
+def _read_queue(cursor):
+    """Queued (queue_id, sale_day) rows that are committed and therefore visible now"""
+    cursor.execute("SELECT queue_id, sale_day FROM sales_rollup_queue ORDER BY queue_id")
+    return cursor.fetchall()
+
+def _delete_queued(cursor, queue_ids, batch_size=1000):
+    """Remove exactly the queue rows that were read
+
+    Rows queued by transactions that were still open when the queue was read were not
+    seen, so they stay queued and are handled by the next refresh.
+    """
+    for batch_start in range(0, len(queue_ids), batch_size):
+        batch = queue_ids[batch_start:batch_start + batch_size]
+        placeholders = ', '.join(['%s'] * len(batch))
+        cursor.execute(f"DELETE FROM sales_rollup_queue WHERE queue_id IN ({placeholders})", batch)
+
+def backfill_sales_rollup(cursor, from_day=None, to_day=None, chunk_days=31):
+    """Rebuild the daily rollup for a range of days (defaults to the whole sales history)"""
+    _use_read_committed(cursor)
+    cursor.execute("SELECT NOW()")
+    started_at = cursor.fetchone()[0]
+    full_history = from_day is None and to_day is None
+
+    # Anything queued before a full rebuild starts is covered by it
+    queued = _read_queue(cursor) if full_history else []
+
+    if from_day is None or to_day is None:
+        cursor.execute("SELECT DATE(MIN(sale_date)), DATE(MAX(sale_date)) FROM sales")
+        first_day, last_day = cursor.fetchone()
+        if first_day is None:
+            print("ℹ️  No sales to roll up")
+            if full_history:
+                _delete_queued(cursor, [queue_id for queue_id, _ in queued])
+                _set_watermark(cursor, started_at)
+            return
+        from_day = from_day or first_day
+        to_day = to_day or last_day
+
+    print(f"📅 Backfilling sales rollup from {from_day} to {to_day}...")
+
+    chunk_start = from_day
+    while chunk_start <= to_day:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), to_day)
+        cursor.callproc('RefreshSalesDailyRollup', (chunk_start, chunk_end))
+        print(f"   Rolled up {chunk_start} → {chunk_end}")
+        chunk_start = chunk_end + timedelta(days=1)
+
+    # Only a full rebuild clears pending changes; a partial backfill leaves the queue alone
+    if full_history:
+        _delete_queued(cursor, [queue_id for queue_id, _ in queued])
+        _set_watermark(cursor, started_at)
+
+    print("✅ Sales rollup backfilled")
+
+def refresh_sales_rollup(cursor):
+    """Re-aggregate only the days queued by inserts, updates and deletes on sales
+
+    The first refresh after the tables are created or cleared does a full backfill.
+    Call it outside an open transaction so the READ COMMITTED switch applies.
+    """
+    _use_read_committed(cursor)
+    cursor.execute("SELECT last_refreshed_at FROM rollup_state WHERE rollup_name = %s", (ROLLUP_NAME,))
+    row = cursor.fetchone()
+    if row is None or row[0] is None:
+        backfill_sales_rollup(cursor)
+        return
+
+    cursor.execute("SELECT NOW()")
+    started_at = cursor.fetchone()[0]
+
+    queued = _read_queue(cursor)
+    dirty_days = sorted({sale_day for _, sale_day in queued})
+
+    for from_day, to_day in _day_ranges(dirty_days):
+        cursor.callproc('RefreshSalesDailyRollup', (from_day, to_day))
+
+    _delete_queued(cursor, [queue_id for queue_id, _ in queued])
+    _set_watermark(cursor, started_at)
+    print(f"✅ Sales rollup refreshed ({len(dirty_days)} days updated)")
+
+if __name__ == "__main__":
+    from populate_script import connect_to_database
+
+    parser = argparse.ArgumentParser(description="Maintain the daily sales rollup tables")
+    parser.add_argument('command', choices=['refresh', 'backfill'],
+                        help="refresh: only days with new or changed sales; backfill: rebuild a date range")
+    parser.add_argument('--from-day', type=date.fromisoformat, help="First day to backfill (YYYY-MM-DD)")
+    parser.add_argument('--to-day', type=date.fromisoformat, help="Last day to backfill (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    conn = connect_to_database()
+    cursor = conn.cursor()
+    try:
+        if args.command == 'backfill':
+            backfill_sales_rollup(cursor, args.from_day, args.to_day)
+        else:
+            refresh_sales_rollup(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
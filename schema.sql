@@ -90,7 +90,7 @@ CREATE TABLE products(
 CREATE TABLE sales(
   sale_id INT AUTO_INCREMENT PRIMARY KEY,
   customer_id INT NOT NULL,
-  sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  sale_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   subtotal DECIMAL(10, 2) NOT NULL DEFAULT 0 CHECK (subtotal >= 0),
   tax_amount DECIMAL(10, 2) DEFAULT 0 CHECK (tax_amount >= 0),
   discount_amount DECIMAL(10, 2) DEFAULT 0 CHECK (discount_amount >= 0),
@@ -107,7 +107,8 @@ CREATE TABLE sales(
 
   -- Indexes for performance
   INDEX idx_sale_date (sale_date),
-  INDEX idx_sale_customer (customer_id),
+  -- Matches the (customer_id, sale_date, sale_id) keyset used for purchase history paging
+  INDEX idx_sale_customer (customer_id, sale_date, sale_id),
   INDEX idx_sale_status (payment_status),
   INDEX idx_sale_total (total_amount)
 );
@@ -130,6 +131,104 @@ CREATE TABLE sale_items(
   INDEX idx_sale_items_product (product_id)
 );
 
+-- Daily sales rollup, maintained by RefreshSalesDailyRollup (see rollup.py)
+-- Rows with category_id = 0 hold whole-sale totals for the day, status and rep.
+-- Other rows hold line-item totals for one category (-1 = uncategorised);
+-- their sales_count is the number of sales containing that category.
+CREATE TABLE sales_daily_rollup (
+  sale_day DATE NOT NULL,
+  payment_status ENUM('pending', 'paid', 'refunded', 'cancelled') NOT NULL,
+  sales_rep_id INT NOT NULL DEFAULT 0,  -- 0 = no sales rep
+  category_id INT NOT NULL DEFAULT 0,
+  sales_count INT NOT NULL DEFAULT 0,
+  subtotal DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  tax_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  discount_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  total_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  item_count INT NOT NULL DEFAULT 0,
+  units_sold INT NOT NULL DEFAULT 0,
+  line_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  line_cost DECIMAL(14, 2) NOT NULL DEFAULT 0,
+
+  PRIMARY KEY (sale_day, payment_status, sales_rep_id, category_id),
+  -- Whole-sale (category_id = 0) or single-category reads over a date window
+  INDEX idx_daily_rollup_category (category_id, sale_day)
+);
+
+-- Monthly and quarterly rollups, re-derived from the daily rollup for the
+-- months and quarters each RefreshSalesDailyRollup call touches
+CREATE TABLE sales_monthly_rollup (
+  month_start DATE NOT NULL,  -- first day of the month
+  payment_status ENUM('pending', 'paid', 'refunded', 'cancelled') NOT NULL,
+  sales_rep_id INT NOT NULL DEFAULT 0,
+  category_id INT NOT NULL DEFAULT 0,
+  sales_count INT NOT NULL DEFAULT 0,
+  subtotal DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  tax_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  discount_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  total_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  item_count INT NOT NULL DEFAULT 0,
+  units_sold INT NOT NULL DEFAULT 0,
+  line_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  line_cost DECIMAL(14, 2) NOT NULL DEFAULT 0,
+
+  PRIMARY KEY (month_start, payment_status, sales_rep_id, category_id),
+  INDEX idx_monthly_rollup_category (category_id, month_start)
+);
+
+CREATE TABLE sales_quarterly_rollup (
+  quarter_start DATE NOT NULL,  -- first day of the quarter
+  payment_status ENUM('pending', 'paid', 'refunded', 'cancelled') NOT NULL,
+  sales_rep_id INT NOT NULL DEFAULT 0,
+  category_id INT NOT NULL DEFAULT 0,
+  sales_count INT NOT NULL DEFAULT 0,
+  subtotal DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  tax_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  discount_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  total_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  item_count INT NOT NULL DEFAULT 0,
+  units_sold INT NOT NULL DEFAULT 0,
+  line_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  line_cost DECIMAL(14, 2) NOT NULL DEFAULT 0,
+
+  PRIMARY KEY (quarter_start, payment_status, sales_rep_id, category_id),
+  INDEX idx_quarterly_rollup_category (category_id, quarter_start)
+);
+
+-- Latest RFM scores per customer, written by rfm.py for customers whose scores moved
+CREATE TABLE customer_rfm_segments (
+  customer_id INT PRIMARY KEY,
+  recency_score TINYINT NOT NULL,
+  frequency_score TINYINT NOT NULL,
+  monetary_score TINYINT NOT NULL,
+  segment VARCHAR(30) NOT NULL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+  FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
+
+  INDEX idx_rfm_segment (segment)
+);
+
+-- Customers whose RFM inputs changed, queued by the queue_rfm_* triggers on sales
+-- and consumed by rfm.py, which re-reads each queued customer's sales
+CREATE TABLE rfm_customer_queue (
+  queue_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  customer_id INT NOT NULL
+);
+
+-- Watermarks for incremental refreshes
+CREATE TABLE rollup_state (
+  rollup_name VARCHAR(50) PRIMARY KEY,
+  last_refreshed_at TIMESTAMP NULL
+);
+
+-- Days whose rollup rows are stale, queued by the queue_rollup_* triggers on sales
+-- and consumed by rollup.py. A day can be queued many times; re-aggregating is idempotent.
+CREATE TABLE sales_rollup_queue (
+  queue_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  sale_day DATE NOT NULL
+);
+
 -- Create triggers to automatically update totals
 DELIMITER //
 
@@ -175,6 +274,60 @@ BEGIN
   WHERE sale_id = OLD.sale_id;
 END//
 
+-- Queue the days touched by every insert, update and delete on sales
+CREATE TRIGGER queue_rollup_on_sale_insert
+AFTER INSERT ON sales
+FOR EACH ROW
+BEGIN
+  INSERT INTO sales_rollup_queue (sale_day) VALUES (DATE(NEW.sale_date));
+END//
+
+CREATE TRIGGER queue_rollup_on_sale_update
+AFTER UPDATE ON sales
+FOR EACH ROW
+BEGIN
+  INSERT INTO sales_rollup_queue (sale_day) VALUES (DATE(NEW.sale_date));
+  IF DATE(OLD.sale_date) <> DATE(NEW.sale_date) THEN
+    INSERT INTO sales_rollup_queue (sale_day) VALUES (DATE(OLD.sale_date));
+  END IF;
+END//
+
+CREATE TRIGGER queue_rollup_on_sale_delete
+AFTER DELETE ON sales
+FOR EACH ROW
+BEGIN
+  INSERT INTO sales_rollup_queue (sale_day) VALUES (DATE(OLD.sale_date));
+END//
+
+-- Queue customers whose purchase count, last purchase date or spend may have changed
+CREATE TRIGGER queue_rfm_on_sale_insert
+AFTER INSERT ON sales
+FOR EACH ROW
+BEGIN
+  INSERT INTO rfm_customer_queue (customer_id) VALUES (NEW.customer_id);
+END//
+
+CREATE TRIGGER queue_rfm_on_sale_update
+AFTER UPDATE ON sales
+FOR EACH ROW
+BEGIN
+  IF NOT (OLD.customer_id <=> NEW.customer_id
+          AND OLD.sale_date <=> NEW.sale_date
+          AND OLD.total_amount <=> NEW.total_amount) THEN
+    INSERT INTO rfm_customer_queue (customer_id) VALUES (NEW.customer_id);
+    IF OLD.customer_id <> NEW.customer_id THEN
+      INSERT INTO rfm_customer_queue (customer_id) VALUES (OLD.customer_id);
+    END IF;
+  END IF;
+END//
+
+CREATE TRIGGER queue_rfm_on_sale_delete
+AFTER DELETE ON sales
+FOR EACH ROW
+BEGIN
+  INSERT INTO rfm_customer_queue (customer_id) VALUES (OLD.customer_id);
+END//
+
 DELIMITER ;
 
 -- Create useful views for reporting
@@ -307,6 +460,150 @@ BEGIN
   ORDER BY s.sale_date DESC;
 END//
 
+-- Batched purchase history for a set of customers, one page at a time.
+-- customer_ids is a JSON array (e.g. '[12, 57, 301]'). Rows are ordered by
+-- (customer_id, sale_date, sale_id); pass the last row of a page as the
+-- after_* arguments to fetch the next one (use 0, NULL, 0 for the first page;
+-- sales.sale_date is NOT NULL, so NULL only ever means "no previous page").
+CREATE PROCEDURE GetCustomersPurchaseHistoryPage(
+  IN customer_ids JSON,
+  IN after_customer_id INT,
+  IN after_sale_date TIMESTAMP,
+  IN after_sale_id INT,
+  IN page_size INT
+)
+BEGIN
+  SELECT 
+    page.customer_id,
+    page.sale_id,
+    page.sale_date,
+    page.total_amount,
+    page.payment_status,
+    GROUP_CONCAT(
+      CONCAT(p.product_name, ' (', si.quantity, ')')
+      SEPARATOR ', '
+    ) AS products_purchased
+  FROM (
+    SELECT s.customer_id, s.sale_id, s.sale_date, s.total_amount, s.payment_status
+    FROM sales s
+    WHERE s.customer_id IN (
+        SELECT ids.customer_id
+        FROM JSON_TABLE(customer_ids, '$[*]' COLUMNS (customer_id INT PATH '$')) AS ids
+      )
+      AND (after_sale_date IS NULL
+        OR s.customer_id > after_customer_id
+        OR (s.customer_id = after_customer_id
+            AND (s.sale_date > after_sale_date
+              OR (s.sale_date = after_sale_date AND s.sale_id > after_sale_id))))
+    ORDER BY s.customer_id, s.sale_date, s.sale_id
+    LIMIT page_size
+  ) AS page
+  LEFT JOIN sale_items si ON page.sale_id = si.sale_id
+  LEFT JOIN products p ON si.product_id = p.product_id
+  GROUP BY page.customer_id, page.sale_id, page.sale_date, page.total_amount, page.payment_status
+  ORDER BY page.customer_id, page.sale_date, page.sale_id;
+END//
+
+-- Rebuild the daily rollup for an inclusive range of days, then the
+-- monthly and quarterly rollups for every month and quarter overlapping it
+CREATE PROCEDURE RefreshSalesDailyRollup(IN from_day DATE, IN to_day DATE)
+BEGIN
+  DECLARE month_from DATE DEFAULT DATE_SUB(from_day, INTERVAL DAYOFMONTH(from_day) - 1 DAY);
+  DECLARE month_to DATE DEFAULT LAST_DAY(to_day);
+  DECLARE quarter_from DATE DEFAULT MAKEDATE(YEAR(from_day), 1) + INTERVAL QUARTER(from_day) - 1 QUARTER;
+  DECLARE quarter_to DATE DEFAULT MAKEDATE(YEAR(to_day), 1) + INTERVAL QUARTER(to_day) QUARTER - INTERVAL 1 DAY;
+
+  DELETE FROM sales_daily_rollup
+  WHERE sale_day BETWEEN from_day AND to_day;
+
+  -- Whole-sale totals
+  INSERT INTO sales_daily_rollup (sale_day, payment_status, sales_rep_id, category_id,
+                                  sales_count, subtotal, tax_amount, discount_amount, total_amount)
+  SELECT 
+    DATE(s.sale_date),
+    COALESCE(s.payment_status, 'pending'),
+    COALESCE(s.sales_rep_id, 0),
+    0,
+    COUNT(*),
+    SUM(s.subtotal),
+    SUM(s.tax_amount),
+    SUM(s.discount_amount),
+    SUM(s.total_amount)
+  FROM sales s
+  WHERE s.sale_date >= from_day
+    AND s.sale_date < to_day + INTERVAL 1 DAY
+  GROUP BY DATE(s.sale_date), COALESCE(s.payment_status, 'pending'), COALESCE(s.sales_rep_id, 0);
+
+  -- Line-item totals per category
+  INSERT INTO sales_daily_rollup (sale_day, payment_status, sales_rep_id, category_id,
+                                  sales_count, item_count, units_sold, line_revenue, line_cost)
+  SELECT 
+    DATE(s.sale_date),
+    COALESCE(s.payment_status, 'pending'),
+    COALESCE(s.sales_rep_id, 0),
+    COALESCE(p.category_id, -1),
+    COUNT(DISTINCT s.sale_id),
+    COUNT(*),
+    SUM(si.quantity),
+    SUM(si.line_total),
+    SUM(COALESCE(p.cost, 0) * si.quantity)
+  FROM sales s
+  JOIN sale_items si ON s.sale_id = si.sale_id
+  JOIN products p ON si.product_id = p.product_id
+  WHERE s.sale_date >= from_day
+    AND s.sale_date < to_day + INTERVAL 1 DAY
+  GROUP BY DATE(s.sale_date), COALESCE(s.payment_status, 'pending'), 
+           COALESCE(s.sales_rep_id, 0), COALESCE(p.category_id, -1);
+
+  DELETE FROM sales_monthly_rollup
+  WHERE month_start BETWEEN month_from AND month_to;
+
+  INSERT INTO sales_monthly_rollup (month_start, payment_status, sales_rep_id, category_id,
+                                    sales_count, subtotal, tax_amount, discount_amount, total_amount,
+                                    item_count, units_sold, line_revenue, line_cost)
+  SELECT 
+    DATE_SUB(sale_day, INTERVAL DAYOFMONTH(sale_day) - 1 DAY) AS month_start,
+    payment_status,
+    sales_rep_id,
+    category_id,
+    SUM(sales_count),
+    SUM(subtotal),
+    SUM(tax_amount),
+    SUM(discount_amount),
+    SUM(total_amount),
+    SUM(item_count),
+    SUM(units_sold),
+    SUM(line_revenue),
+    SUM(line_cost)
+  FROM sales_daily_rollup
+  WHERE sale_day BETWEEN month_from AND month_to
+  GROUP BY month_start, payment_status, sales_rep_id, category_id;
+
+  DELETE FROM sales_quarterly_rollup
+  WHERE quarter_start BETWEEN quarter_from AND quarter_to;
+
+  INSERT INTO sales_quarterly_rollup (quarter_start, payment_status, sales_rep_id, category_id,
+                                      sales_count, subtotal, tax_amount, discount_amount, total_amount,
+                                      item_count, units_sold, line_revenue, line_cost)
+  SELECT 
+    MAKEDATE(YEAR(sale_day), 1) + INTERVAL QUARTER(sale_day) - 1 QUARTER AS quarter_start,
+    payment_status,
+    sales_rep_id,
+    category_id,
+    SUM(sales_count),
+    SUM(subtotal),
+    SUM(tax_amount),
+    SUM(discount_amount),
+    SUM(total_amount),
+    SUM(item_count),
+    SUM(units_sold),
+    SUM(line_revenue),
+    SUM(line_cost)
+  FROM sales_daily_rollup
+  WHERE sale_day BETWEEN quarter_from AND quarter_to
+  GROUP BY quarter_start, payment_status, sales_rep_id, category_id;
+END//
+
 CREATE PROCEDURE UpdateProductStock(
   IN product_id_param INT, 
   IN quantity_change INT